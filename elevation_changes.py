@@ -0,0 +1,129 @@
+"""
+Change feed over the grid databases.
+
+Every shard's ``elevation_points`` table has an autoincrement ``id`` (older
+shards without one still have SQLite's implicit ``rowid``, which ``id``
+aliases), so the largest id a consumer has seen is a cheap high-water mark:
+rows with a larger id were collected afterwards. A checkpoint is a plain dict
+mapping each shard path to its mark (max id, latest collected_at, row count
+and the row at the max id), which consumers store next to whatever they
+build from the points.
+
+Rows rewritten with INSERT OR REPLACE get a new id and the old row vanishes;
+the row count and the stored row catch that, and the shard is reported as
+reset so consumers that accumulate points can rebuild instead of adding.
+
+Cost trade-off: an unchanged shard costs two rowid lookups. ``COUNT(*)``
+scans the whole table, so it only runs once the max id has moved, which
+means new rows are about to be read anyway. As a result, a shard whose
+only change is deleted rows is reported as reset on its next insert, not
+right away.
+"""
+
+import glob
+import sqlite3
+from contextlib import closing
+
+DEFAULT_DB_PATTERN = 'grid_databases/mountains_*.db'
+
+def empty_mark():
+    return {'max_id': 0, 'collected_at': None, 'count': 0, 'last_row': None}
+
+def _mark_row_changed(cursor, mark):
+    """True if the row at the mark is gone or different, e.g. the shard was recreated"""
+    if mark['max_id'] == 0 or mark.get('last_row') is None:
+        return False
+    cursor.execute("""
+        SELECT latitude, longitude, elevation FROM elevation_points WHERE rowid = ?
+    """, [mark['max_id']])
+    row = cursor.fetchone()
+    return row is None or list(row) != list(mark['last_row'])
+
+def _older_rows_removed(cursor, mark, shard_count):
+    """True if rows at or below the mark were replaced (INSERT OR REPLACE) or deleted"""
+    if mark['max_id'] == 0 or 'count' not in mark:
+        return False
+    # Every row added since the mark must show up in the count; if the count
+    # grew by less, some older rows are gone
+    cursor.execute("SELECT COUNT(*) FROM elevation_points WHERE rowid > ?", [mark['max_id']])
+    return shard_count - mark['count'] < cursor.fetchone()[0]
+
+def iter_new_points(checkpoint, db_files=None, bounds=None):
+    """Yield (db_file, points, mark, reset) for each shard that changed since checkpoint.
+
+    points is a list of (latitude, longitude, elevation) tuples, optionally
+    limited to bounds (a dict shaped like NM_BOUNDS). mark is the new
+    high-water mark for db_file; store it in the checkpoint once the points
+    have been applied so an interrupted consumer re-reads them next time.
+    The checkpoint itself is not modified.
+
+    reset is True when rows the checkpoint already covered were replaced,
+    deleted, or the shard was recreated. points then holds the whole shard,
+    and anything built from its earlier rows is stale.
+    """
+    if db_files is None:
+        db_files = sorted(glob.glob(DEFAULT_DB_PATTERN))
+
+    for db_file in db_files:
+        mark = checkpoint.get(db_file, empty_mark())
+        try:
+            with closing(sqlite3.connect(db_file)) as conn:
+                cursor = conn.cursor()
+                # Read everything from one snapshot while collectors keep writing
+                cursor.execute("BEGIN")
+
+                cursor.execute("SELECT MAX(rowid) FROM elevation_points")
+                shard_max_id = cursor.fetchone()[0] or 0
+                row_changed = _mark_row_changed(cursor, mark)
+                if shard_max_id == mark['max_id'] and not row_changed:
+                    continue
+
+                cursor.execute("SELECT COUNT(*) FROM elevation_points")
+                shard_count = cursor.fetchone()[0]
+                reset = (shard_max_id < mark['max_id'] or row_changed
+                         or _older_rows_removed(cursor, mark, shard_count))
+                last_id = 0 if reset else mark['max_id']
+
+                collected_at = None
+                cursor.execute("PRAGMA table_info(elevation_points)")
+                if 'collected_at' in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute("""
+                        SELECT MAX(collected_at) FROM elevation_points
+                        WHERE rowid > ? AND rowid <= ?
+                    """, [last_id, shard_max_id])
+                    collected_at = cursor.fetchone()[0]
+
+                last_row = None
+                if shard_max_id:
+                    cursor.execute("""
+                        SELECT latitude, longitude, elevation FROM elevation_points WHERE rowid = ?
+                    """, [shard_max_id])
+                    last_row = list(cursor.fetchone())
+
+                query = """
+                    SELECT latitude, longitude, elevation
+                    FROM elevation_points
+                    WHERE rowid > ? AND rowid <= ?
+                    AND elevation IS NOT NULL
+                """
+                params = [last_id, shard_max_id]
+                if bounds is not None:
+                    query += """
+                    AND latitude BETWEEN ? AND ?
+                    AND longitude BETWEEN ? AND ?
+                    """
+                    params += [bounds['minLat'], bounds['maxLat'],
+                               bounds['minLon'], bounds['maxLon']]
+                cursor.execute(query, params)
+                points = cursor.fetchall()
+
+        except sqlite3.Error as e:
+            print(f"Error reading {db_file}: {e}")
+            continue
+
+        yield db_file, points, {
+            'max_id': shard_max_id,
+            'collected_at': collected_at,
+            'count': shard_count,
+            'last_row': last_row,
+        }, reset
@@ -3,6 +3,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import glob
+import gc
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from image_output import save_image_variants, report_saved
 
 def load_all_elevation_data():
     """Load elevation data from all grid databases."""
@@ -51,13 +56,14 @@ def load_all_elevation_data():
     
     return all_points
 
-def create_contour_map():
+def render_contour_map():
+    """Plot the contour map and return it as an RGB image, or None without data"""
     # Load all elevation data
     points = load_all_elevation_data()
     
     if not points:
         print("No elevation data found!")
-        return
+        return None
     
     # Convert points to numpy arrays
     lats = np.array([p[0] for p in points])
@@ -99,14 +105,35 @@ def create_contour_map():
     # Add grid
     plt.grid(True, linestyle='--', alpha=0.3)
     
-    # Save the map with maximum quality
-    print("\nSaving high-resolution contour map...")
-    plt.savefig('nm_contour_map.png', 
-                dpi=300, 
-                bbox_inches='tight')
-    plt.close()
+    # Take the rendered frame straight from the Agg canvas (no PNG round
+    # trip), cropped to the same tight bounding box savefig would use
+    fig = plt.gcf()
+    fig.canvas.draw()
+    width, height = fig.canvas.get_width_height()
+    bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(0.1)
+    left, top = int(bbox.x0 * fig.dpi), int(height - bbox.y1 * fig.dpi)
+    box = (left, top, left + int(bbox.width * fig.dpi), top + int(bbox.height * fig.dpi))
+    frame = Image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+    # The map is opaque; dropping alpha once here saves a conversion per variant
+    image = frame.crop(box).convert('RGB')
+    plt.close(fig)
+    return image
+
+def create_contour_map(preset='web-graphic'):
+    # Rendering holds every point and the triangulation; the figure keeps them
+    # in reference cycles, so collect before the encoders need the memory
+    image = render_contour_map()
+    if image is None:
+        return
+    gc.collect()
     
-    print("Contour map saved as nm_contour_map.png")
+    print("\nSaving high-resolution contour map...")
+    with ThreadPoolExecutor() as executor:
+        report_saved(save_image_variants(image, 'nm_contour_map', preset, executor))
 
 if __name__ == "__main__":
-    create_contour_map() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Render the New Mexico contour map')
+    parser.add_argument('--preset', choices=['web-graphic', 'archive'], default='web-graphic',
+                        help='Output formats: web-graphic (256-color PNG + WebP) or archive (PNG + high quality JPEG)')
+    args = parser.parse_args()
+    create_contour_map(args.preset)
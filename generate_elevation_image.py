@@ -5,6 +5,11 @@ import os
 import math
 from nm_border import draw_border, NM_BORDER_POINTS
 import glob
+import json
+import argparse
+from elevation_changes import iter_new_points
+from concurrent.futures import ThreadPoolExecutor
+from image_output import save_image_variants, report_saved
 
 # New Mexico bounds
 NM_BOUNDS = {
@@ -295,45 +300,32 @@ def create_elevation_legend(image, min_elev, max_elev, width=2000, height=2000):
     # Draw title
     draw.text((title_x, legend_y - 25), title, font=font, fill='black')
 
-def create_elevation_image(points, width=2000, height=2000):
-    """Create an elevation image from points"""
-    print("Starting elevation image creation...")
-    total_steps = 4  # Total number of major steps
-    current_step = 0
-    
-    # Create empty grid
-    grid = np.zeros((height, width), dtype=np.float32)
-    counts = np.zeros((height, width), dtype=np.int32)
-    
-    # Find elevation range
-    current_step += 1
-    print(f"Step {current_step}/{total_steps}: Processing elevation data...")
-    elevations = [p[2] for p in points]
-    min_elev = min(elevations)
-    max_elev = max(elevations)
-    
-    # Convert points to grid coordinates
-    print(f"Step {current_step}/{total_steps}: Converting points to grid...")
-    total_points = len(points)
-    for i, (lat, lon, elev) in enumerate(points):
-        if i % 10000 == 0:  # Show progress every 10,000 points
-            print(f"Processing points: {i}/{total_points} ({(i/total_points*100):.1f}%)")
-        x = int((lon - NM_BOUNDS['minLon']) / (NM_BOUNDS['maxLon'] - NM_BOUNDS['minLon']) * (width - 1))
-        y = int((NM_BOUNDS['maxLat'] - lat) / (NM_BOUNDS['maxLat'] - NM_BOUNDS['minLat']) * (height - 1))
-        if 0 <= x < width and 0 <= y < height:
-            grid[y, x] += elev
-            counts[y, x] += 1
+def accumulate_points(points, grid, counts):
+    """Add (lat, lon, elev) points into a running sum grid and count grid in place"""
+    height, width = grid.shape
+    if len(points) == 0:
+        return
+    data = np.asarray(points, dtype=np.float64)
+    lat, lon, elev = data[:, 0], data[:, 1], data[:, 2]
+    x = ((lon - NM_BOUNDS['minLon']) / (NM_BOUNDS['maxLon'] - NM_BOUNDS['minLon']) * (width - 1)).astype(np.int64)
+    y = ((NM_BOUNDS['maxLat'] - lat) / (NM_BOUNDS['maxLat'] - NM_BOUNDS['minLat']) * (height - 1)).astype(np.int64)
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    np.add.at(grid, (y[inside], x[inside]), elev[inside])
+    np.add.at(counts, (y[inside], x[inside]), 1)
+
+def fill_elevation_grid(grid, counts):
+    """Average a sum/count grid and fill empty cells from their nearest neighbor.
+
+    Returns a new float32 grid of elevations in meters; the inputs are left untouched.
+    """
+    grid = grid.astype(np.float32, copy=True)
     
     # Average points in same cell
     mask = counts > 0
     grid[mask] /= counts[mask]
     
-    # Fill empty cells using nearest neighbor interpolation
-    current_step += 1
-    print(f"\nStep {current_step}/{total_steps}: Starting interpolation...")
-    from scipy.ndimage import distance_transform_edt
     mask = counts == 0
-    if mask.any():
+    if mask.any() and not mask.all():
         # Get coordinates of valid points
         valid_points = np.argwhere(~mask)
         # Get coordinates of points to fill
@@ -351,6 +343,123 @@ def create_elevation_image(points, width=2000, height=2000):
             grid[points_to_fill[i:end_idx, 0], points_to_fill[i:end_idx, 1]] = grid[valid_points[indices, 0], valid_points[indices, 1]]
             print(f"Interpolation progress: {end_idx}/{total_to_fill} ({(end_idx/total_to_fill*100):.1f}%)")
     
+    return grid
+
+GRID_STATE_PATH = 'cache/elevation_grid_state.npz'
+
+def load_grid_state(state_path, width, height):
+    """Load a cached sum/count grid and its change-feed checkpoint.
+
+    Returns a fresh empty state if the file is missing or was built for a
+    different image size.
+    """
+    if os.path.exists(state_path):
+        with np.load(state_path) as data:
+            if data['sums'].shape == (height, width):
+                return {
+                    'sums': data['sums'],
+                    'counts': data['counts'],
+                    'min_elev': float(data['min_elev']),
+                    'max_elev': float(data['max_elev']),
+                    'total_points': int(data['total_points']),
+                    'checkpoint': json.loads(str(data['checkpoint'])),
+                }
+        print(f"Ignoring {state_path}: built for a different image size")
+    return empty_grid_state(width, height)
+
+def empty_grid_state(width, height):
+    return {
+        'sums': np.zeros((height, width), dtype=np.float64),
+        'counts': np.zeros((height, width), dtype=np.int32),
+        'min_elev': math.inf,
+        'max_elev': -math.inf,
+        'total_points': 0,
+        'checkpoint': {},
+    }
+
+def save_grid_state(state, state_path):
+    """Write the grid state atomically so a crash never leaves it half-written"""
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f,
+                 sums=state['sums'],
+                 counts=state['counts'],
+                 min_elev=state['min_elev'],
+                 max_elev=state['max_elev'],
+                 total_points=state['total_points'],
+                 checkpoint=json.dumps(state['checkpoint']))
+    os.replace(tmp_path, state_path)
+
+def apply_new_points(state, db_files):
+    """Add new points from db_files to state in place.
+
+    Returns False without finishing if a shard reports rows that were already
+    counted as replaced or removed; sums and the elevation range can only grow,
+    so the caller has to rebuild from an empty state.
+    """
+    for db_file, points, mark, reset in iter_new_points(state['checkpoint'], db_files, bounds=NM_BOUNDS):
+        if reset:
+            print(f"{db_file} had rows replaced or removed since the last run")
+            return False
+        if points:
+            accumulate_points(points, state['sums'], state['counts'])
+            elevations = [p[2] for p in points]
+            state['min_elev'] = min(state['min_elev'], min(elevations))
+            state['max_elev'] = max(state['max_elev'], max(elevations))
+            state['total_points'] += len(points)
+        state['checkpoint'][db_file] = mark
+    return True
+
+def update_grid_state(state_path=GRID_STATE_PATH, width=2000, height=2000):
+    """Fold points collected since the last run into the cached sum/count grid"""
+    state = load_grid_state(state_path, width, height)
+    previous_points = state['total_points']
+    db_files = sorted(glob.glob('grid_databases/mountains_*.db'))
+    removed = set(state['checkpoint']) - set(db_files)
+    if removed:
+        print(f"{len(removed)} grid database(s) no longer exist")
+    if removed or not apply_new_points(state, db_files):
+        print("Rebuilding the elevation grid from scratch...")
+        state = empty_grid_state(width, height)
+        apply_new_points(state, db_files)
+        print(f"Rebuilt grid from {state['total_points']:,} points")
+    else:
+        print(f"Added {state['total_points'] - previous_points:,} new points ({state['total_points']:,} total)")
+    save_grid_state(state, state_path)
+    return state
+
+def create_elevation_image(points, width=2000, height=2000, preset='web'):
+    """Create an elevation image from points"""
+    print("Starting elevation image creation...")
+    total_steps = 4  # Total number of major steps
+    current_step = 0
+    
+    # Find elevation range
+    current_step += 1
+    print(f"Step {current_step}/{total_steps}: Processing elevation data...")
+    elevations = [p[2] for p in points]
+    min_elev = min(elevations)
+    max_elev = max(elevations)
+    
+    # Convert points to grid coordinates
+    print(f"Step {current_step}/{total_steps}: Converting points to grid...")
+    grid = np.zeros((height, width), dtype=np.float32)
+    counts = np.zeros((height, width), dtype=np.int32)
+    accumulate_points(points, grid, counts)
+    
+    render_elevation_images(grid, counts, min_elev, max_elev, len(points), width, height, preset)
+
+def render_elevation_images(grid, counts, min_elev, max_elev, total_points, width=2000, height=2000, preset='web'):
+    """Render the blue-yellow and rainbow images from a sum/count grid"""
+    total_steps = 4
+    current_step = 1
+    
+    # Fill empty cells using nearest neighbor interpolation
+    current_step += 1
+    print(f"\nStep {current_step}/{total_steps}: Starting interpolation...")
+    grid = fill_elevation_grid(grid, counts)
+    
     # Normalize to 0-1 range
     grid = (grid - min_elev) / (max_elev - min_elev)
     
@@ -382,27 +491,43 @@ def create_elevation_image(points, width=2000, height=2000):
     # Add elevation legend
     create_elevation_legend(image, min_elev, max_elev, width, height)
     
-    # Save blue-yellow image
-    os.makedirs('public/images', exist_ok=True)
-    image.save('public/images/elevation.jpg', quality=95)
-    print(f"Created elevation image with {len(points):,} points")
-    print(f"Elevation range: {min_elev:.1f}m to {max_elev:.1f}m")
-    print("Added markers for top 10 New Mexico cities")
+    with ThreadPoolExecutor() as executor:
+        # Encode blue-yellow image in the background while the rainbow image is built
+        futures = save_image_variants(image, 'public/images/elevation', preset, executor)
+        print(f"Created elevation image with {total_points:,} points")
+        print(f"Elevation range: {min_elev:.1f}m to {max_elev:.1f}m")
+        print("Added markers for top 10 New Mexico cities")
 
-    # Create rainbow image
-    current_step += 1
-    print(f"\nStep {current_step}/{total_steps}: Creating rainbow image...")
-    image_rainbow = create_rainbow_image(grid, width, height)
-    draw_rainbow = ImageDraw.Draw(image_rainbow)
-    add_city_markers(image_rainbow, width, height)
+        # Create rainbow image
+        current_step += 1
+        print(f"\nStep {current_step}/{total_steps}: Creating rainbow image...")
+        image_rainbow = create_rainbow_image(grid, width, height)
+        draw_rainbow = ImageDraw.Draw(image_rainbow)
+        add_city_markers(image_rainbow, width, height)
     
-    # Add elevation legend to rainbow image
-    create_elevation_legend(image_rainbow, min_elev, max_elev, width, height)
+        # Add elevation legend to rainbow image
+        create_elevation_legend(image_rainbow, min_elev, max_elev, width, height)
     
-    image_rainbow.save('public/images/elevation_rainbow.jpg', quality=95)
-    print("Created rainbow elevation image as public/images/elevation_rainbow.jpg")
+        futures += save_image_variants(image_rainbow, 'public/images/elevation_rainbow', preset, executor)
+        print(f"Encoding images with the '{preset}' preset...")
+        report_saved(futures)
     print("\nAll steps completed successfully!")
 
 if __name__ == '__main__':
-    points = get_elevation_data()
-    create_elevation_image(points) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Render the static elevation images')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'Only read points collected since the last run, caching the grid in {GRID_STATE_PATH}')
+    parser.add_argument('--preset', choices=['web', 'archive'], default='web',
+                        help='Output formats: web (WebP + progressive JPEG) or archive (PNG + high quality JPEG)')
+    args = parser.parse_args()
+
+    if args.incremental:
+        state = update_grid_state()
+        if state['total_points'] == 0:
+            print("No elevation data found!")
+        else:
+            render_elevation_images(state['sums'], state['counts'], state['min_elev'],
+                                    state['max_elev'], state['total_points'], preset=args.preset)
+    else:
+        points = get_elevation_data()
+        create_elevation_image(points, preset=args.preset)
@@ -0,0 +1,313 @@
+"""
+Build a decimated terrain mesh for the 3D viewers.
+
+The gridded elevation is triangulated offline with a right-triangulated
+irregular network (RTIN): the grid is recursively split into right triangles
+and a triangle is only split further where any grid point inside it deviates
+from it by more than ``max_error`` meters. The resulting mesh is written as a
+JSON manifest plus one binary file holding per-chunk vertex and index buffers,
+laid out so each buffer can be handed to ``gl.bufferData`` as-is.
+
+Binary layout (little endian, every buffer 4-byte aligned):
+    vertices  Uint16 x3 (x, y, z) when quantized, otherwise Float32 x3 (lon, lat, elevation)
+    indices   Uint16 triangle list; each chunk holds at most 65535 vertices
+
+Quantized vertices decode as ``value / 65535 * scale + offset`` per axis, with
+``scale`` and ``offset`` stored in the manifest (matches a normalized
+UNSIGNED_SHORT attribute followed by a scale/offset in the vertex shader).
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+from generate_elevation_image import NM_BOUNDS, get_elevation_data, accumulate_points, fill_elevation_grid
+
+MAX_CHUNK_VERTICES = 65535
+# Grid samples evaluated per batch when measuring triangle errors
+MAX_ERROR_SAMPLES = 1 << 21
+
+class TerrainMesher:
+    """RTIN mesher for a square (2^k + 1) x (2^k + 1) height grid"""
+
+    def __init__(self, grid_size=513):
+        tile_size = grid_size - 1
+        if tile_size < 2 or tile_size & (tile_size - 1):
+            raise ValueError(f"grid_size must be 2^k + 1, got {grid_size}")
+
+        self.grid_size = grid_size
+        num_triangles = tile_size * tile_size * 2 - 2
+        num_parent_triangles = num_triangles - tile_size * tile_size
+
+        # Triangle ids encode the path from one of the two root triangles;
+        # walk every id down to its (a, b) hypotenuse endpoints at once.
+        ids = np.arange(num_triangles, dtype=np.int64) + 2
+        odd = (ids & 1).astype(bool)
+        ax = np.where(odd, 0, tile_size)
+        ay = np.where(odd, 0, tile_size)
+        bx = np.where(odd, tile_size, 0)
+        by = np.where(odd, tile_size, 0)
+        cx = np.where(odd, tile_size, 0)
+        cy = np.where(odd, 0, tile_size)
+
+        ids >>= 1
+        while (ids > 1).any():
+            active = ids > 1
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            left = active & (ids & 1).astype(bool)
+            right = active & ~(ids & 1).astype(bool)
+            ax, ay, bx, by = (
+                np.where(left, cx, np.where(right, bx, ax)),
+                np.where(left, cy, np.where(right, by, ay)),
+                np.where(left, ax, np.where(right, cx, bx)),
+                np.where(left, ay, np.where(right, cy, by)),
+            )
+            cx = np.where(active, mx, cx)
+            cy = np.where(active, my, cy)
+            ids >>= 1
+
+        # Level of each triangle (0 = root); errors are propagated level by
+        # level from the smallest triangles up.
+        levels = np.floor(np.log2(np.arange(num_triangles) + 2)).astype(np.int64) - 1
+        self._coords = np.stack([ax, ay, bx, by], axis=1)
+        self._levels = levels
+        self._num_parent_triangles = num_parent_triangles
+
+    def compute_errors(self, heights):
+        """Return the per-vertex approximation error map for a height grid.
+
+        The error stored at a hypotenuse midpoint is the largest deviation of
+        any grid point from the triangles split there or below, so emitting a
+        triangle whose midpoint error is within max_error bounds the whole mesh.
+        """
+        size = self.grid_size
+        if heights.shape != (size, size):
+            raise ValueError(f"heights must be {size}x{size}, got {heights.shape[0]}x{heights.shape[1]}")
+
+        terrain = heights.astype(np.float64).reshape(-1)
+        errors = np.zeros(size * size, dtype=np.float64)
+        triangle_ids = np.arange(len(self._coords))
+
+        for level in range(self._levels.max(), -1, -1):
+            in_level = self._levels == level
+            ax, ay, bx, by = self._coords[in_level].T
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            cx = mx + my - ay
+            cy = my + ax - mx
+
+            middle = my * size + mx
+            np.maximum.at(errors, middle, self._triangle_errors(terrain, ax, ay, bx, by, cx, cy))
+
+            parents = triangle_ids[in_level] < self._num_parent_triangles
+            if parents.any():
+                left_child = ((ay + cy) >> 1) * size + ((ax + cx) >> 1)
+                right_child = ((by + cy) >> 1) * size + ((bx + cx) >> 1)
+                child_error = np.maximum(errors[left_child], errors[right_child])
+                np.maximum.at(errors, middle[parents], child_error[parents])
+
+        return errors
+
+    def _triangle_errors(self, terrain, ax, ay, bx, by, cx, cy):
+        """Largest deviation of any grid point inside each triangle from its plane"""
+        size = self.grid_size
+        min_x = np.minimum(np.minimum(ax, bx), cx)
+        min_y = np.minimum(np.minimum(ay, by), cy)
+        max_x = np.maximum(np.maximum(ax, bx), cx)
+        max_y = np.maximum(np.maximum(ay, by), cy)
+
+        # Sample every triangle's bounding box at once; points outside the
+        # triangle (or the box, for smaller boxes) are masked out
+        oy, ox = np.mgrid[0:(max_y - min_y).max() + 1, 0:(max_x - min_x).max() + 1]
+        batch = max(1, MAX_ERROR_SAMPLES // ox.size)
+        if len(ax) > batch:
+            return np.concatenate([
+                self._triangle_errors(terrain, *(v[i:i + batch] for v in (ax, ay, bx, by, cx, cy)))
+                for i in range(0, len(ax), batch)
+            ])
+        xs = min_x[:, None] + ox.reshape(1, -1)
+        ys = min_y[:, None] + oy.reshape(1, -1)
+        in_box = (xs <= max_x[:, None]) & (ys <= max_y[:, None])
+        xs = np.minimum(xs, size - 1)
+        ys = np.minimum(ys, size - 1)
+
+        # Barycentric weights of each sample for vertices a and b (c gets the rest)
+        det = ((by - cy) * (ax - cx) + (cx - bx) * (ay - cy))[:, None]
+        wa = ((by - cy)[:, None] * (xs - cx[:, None]) + (cx - bx)[:, None] * (ys - cy[:, None])) / det
+        wb = ((cy - ay)[:, None] * (xs - cx[:, None]) + (ax - cx)[:, None] * (ys - cy[:, None])) / det
+        wc = 1 - wa - wb
+        inside = in_box & (wa >= -1e-9) & (wb >= -1e-9) & (wc >= -1e-9)
+
+        plane = (wa * terrain[ay * size + ax][:, None]
+                 + wb * terrain[by * size + bx][:, None]
+                 + wc * terrain[cy * size + cx][:, None])
+        deviation = np.where(inside, np.abs(plane - terrain[ys * size + xs]), 0)
+        return deviation.max(axis=1)
+
+    def build_mesh(self, heights, max_error):
+        """Triangulate a height grid so no cell deviates more than max_error.
+
+        Returns (vertices, triangles): an (N, 2) array of integer grid
+        coordinates and an (M, 3) array of vertex indices.
+        """
+        size = self.grid_size
+        last = size - 1
+        errors = self.compute_errors(heights)
+        vertex_ids = np.full(size * size, -1, dtype=np.int64)
+        vertices = []
+        triangles = []
+
+        def vertex(x, y):
+            key = y * size + x
+            if vertex_ids[key] < 0:
+                vertex_ids[key] = len(vertices)
+                vertices.append((x, y))
+            return int(vertex_ids[key])
+
+        stack = [(0, 0, last, last, last, 0), (last, last, 0, 0, 0, last)]
+        while stack:
+            ax, ay, bx, by, cx, cy = stack.pop()
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            if abs(ax - cx) + abs(ay - cy) > 1 and errors[my * size + mx] > max_error:
+                # Pushed in reverse so the left half is emitted first,
+                # keeping consecutive triangles spatially close.
+                stack.append((bx, by, cx, cy, mx, my))
+                stack.append((cx, cy, ax, ay, mx, my))
+            else:
+                triangles.append((vertex(ax, ay), vertex(bx, by), vertex(cx, cy)))
+
+        return np.array(vertices, dtype=np.int64), np.array(triangles, dtype=np.int64)
+
+def split_into_chunks(vertices, triangles, max_vertices=MAX_CHUNK_VERTICES):
+    """Split a mesh into chunks whose vertex count fits Uint16 indices"""
+    chunks = []
+    remap = {}
+    chunk_triangles = []
+
+    def flush():
+        if chunk_triangles:
+            order = sorted(remap, key=remap.get)
+            chunks.append((vertices[order], np.array(chunk_triangles, dtype=np.uint16)))
+
+    for triangle in triangles:
+        new_vertices = sum(1 for v in set(triangle.tolist()) if v not in remap)
+        if len(remap) + new_vertices > max_vertices:
+            flush()
+            remap = {}
+            chunk_triangles = []
+        local = []
+        for v in triangle.tolist():
+            if v not in remap:
+                remap[v] = len(remap)
+            local.append(remap[v])
+        chunk_triangles.append(local)
+    flush()
+    return chunks
+
+def grid_to_world(grid_vertices, heights):
+    """Convert integer grid coordinates to (lon, lat, elevation) rows"""
+    last = heights.shape[0] - 1
+    x = grid_vertices[:, 0]
+    y = grid_vertices[:, 1]
+    lon = NM_BOUNDS['minLon'] + x / last * (NM_BOUNDS['maxLon'] - NM_BOUNDS['minLon'])
+    lat = NM_BOUNDS['maxLat'] - y / last * (NM_BOUNDS['maxLat'] - NM_BOUNDS['minLat'])
+    return np.stack([lon, lat, heights[y, x]], axis=1)
+
+def write_mesh(chunks, heights, output_path, quantize=True):
+    """Write chunked vertex/index buffers to <output_path>.bin and a .json manifest"""
+    min_elev = float(heights.min())
+    max_elev = float(heights.max())
+    elev_range = max(max_elev - min_elev, 1e-6)
+    base = os.path.splitext(output_path)[0]
+    bin_path = base + '.bin'
+
+    manifest = {
+        'bounds': NM_BOUNDS,
+        'gridSize': int(heights.shape[0]),
+        'minElevation': min_elev,
+        'maxElevation': max_elev,
+        'quantized': quantize,
+        'vertexComponentType': 'UNSIGNED_SHORT' if quantize else 'FLOAT',
+        'indexComponentType': 'UNSIGNED_SHORT',
+        'buffer': os.path.basename(bin_path),
+        'chunks': [],
+    }
+    if quantize:
+        manifest['decode'] = {
+            'scale': [NM_BOUNDS['maxLon'] - NM_BOUNDS['minLon'],
+                      -(NM_BOUNDS['maxLat'] - NM_BOUNDS['minLat']),
+                      elev_range],
+            'offset': [NM_BOUNDS['minLon'], NM_BOUNDS['maxLat'], min_elev],
+        }
+
+    last = heights.shape[0] - 1
+    offset = 0
+    with open(bin_path, 'wb') as f:
+        def write_aligned(data):
+            nonlocal offset
+            start = offset
+            raw = data.tobytes()
+            f.write(raw)
+            offset += len(raw)
+            padding = (-offset) % 4
+            f.write(b'\0' * padding)
+            offset += padding
+            return start, len(raw)
+
+        for grid_vertices, indices in chunks:
+            if quantize:
+                x = grid_vertices[:, 0] * 65535 // last
+                y = grid_vertices[:, 1] * 65535 // last
+                z = np.round((heights[grid_vertices[:, 1], grid_vertices[:, 0]] - min_elev) / elev_range * 65535)
+                vertex_data = np.stack([x, y, z], axis=1).astype('<u2')
+            else:
+                vertex_data = grid_to_world(grid_vertices, heights).astype('<f4')
+            index_data = indices.astype('<u2')
+
+            vertex_offset, vertex_bytes = write_aligned(vertex_data)
+            index_offset, index_bytes = write_aligned(index_data)
+            manifest['chunks'].append({
+                'vertexCount': int(len(vertex_data)),
+                'indexCount': int(index_data.size),
+                'vertexByteOffset': vertex_offset,
+                'vertexByteLength': vertex_bytes,
+                'indexByteOffset': index_offset,
+                'indexByteLength': index_bytes,
+            })
+
+    with open(base + '.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def create_terrain_mesh(points, grid_size=513, max_error=10.0, output_path='public/data/terrain_mesh.json', quantize=True):
+    """Grid elevation points, decimate them to a mesh and write the buffers"""
+    print(f"Gridding {len(points):,} points onto a {grid_size}x{grid_size} grid...")
+    grid = np.zeros((grid_size, grid_size), dtype=np.float32)
+    counts = np.zeros((grid_size, grid_size), dtype=np.int32)
+    accumulate_points(points, grid, counts)
+    heights = fill_elevation_grid(grid, counts)
+
+    print(f"Building mesh with max error {max_error}m...")
+    mesher = TerrainMesher(grid_size)
+    vertices, triangles = mesher.build_mesh(heights, max_error)
+    chunks = split_into_chunks(vertices, triangles)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    manifest = write_mesh(chunks, heights, output_path, quantize=quantize)
+    print(f"Mesh: {len(vertices):,} vertices, {len(triangles):,} triangles "
+          f"({grid_size * grid_size:,} grid points) in {len(manifest['chunks'])} chunk(s)")
+    print(f"Saved {output_path} and {manifest['buffer']}")
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a decimated terrain mesh for the 3D viewer')
+    parser.add_argument('--grid-size', type=int, default=513, help='Grid resolution, must be 2^k + 1')
+    parser.add_argument('--max-error', type=float, default=10.0, help='Maximum vertical error in meters')
+    parser.add_argument('--output', default='public/data/terrain_mesh.json', help='Manifest path; buffers go next to it as .bin')
+    parser.add_argument('--no-quantize', action='store_true', help='Write Float32 lon/lat/elevation instead of Uint16')
+    args = parser.parse_args()
+
+    points = get_elevation_data()
+    create_terrain_mesh(points, args.grid_size, args.max_error, args.output, quantize=not args.no_quantize)
@@ -0,0 +1,86 @@
+"""
+Output stage for the generated map images.
+
+Each image is encoded in every variant of a preset (WebP, progressive JPEG,
+optimized or palette PNG) on a thread pool; Pillow releases the GIL while
+encoding, so variants and images are written concurrently. Files are written
+to a temporary name in the target directory and renamed into place, so the
+web server never serves a half-written image.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Variants written for each preset. 'palette' quantizes to that many colors
+# before saving, which suits flat-color graphics such as the contour map; the
+# lossless WebP is quantized too so it stays smaller than the palette PNG.
+PRESETS = {
+    'web': [
+        {'ext': '.webp', 'format': 'WEBP', 'options': {'quality': 80, 'method': 4}},
+        {'ext': '.jpg', 'format': 'JPEG', 'options': {'quality': 85, 'progressive': True, 'optimize': True}},
+    ],
+    'web-graphic': [
+        {'ext': '.png', 'format': 'PNG', 'palette': 256, 'options': {'optimize': True}},
+        {'ext': '.webp', 'format': 'WEBP', 'palette': 256, 'options': {'lossless': True, 'method': 4}},
+    ],
+    'archive': [
+        {'ext': '.png', 'format': 'PNG', 'options': {'optimize': True}},
+        {'ext': '.jpg', 'format': 'JPEG', 'options': {'quality': 95, 'progressive': True, 'optimize': True, 'subsampling': 0}},
+    ],
+}
+
+def save_atomic(image, path, format, **options):
+    """Save image to path via a temporary file and rename it into place"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format=format, **options)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+def _save_variant(image, path, variant):
+    # Image.save() keeps its options on the image (encoderinfo), so every
+    # concurrent encode needs its own image; reuse a conversion when there is
+    # one rather than copying a full-size frame
+    if 'palette' in variant:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image = image.quantize(colors=variant['palette'])
+    elif variant['format'] == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    else:
+        image = image.copy()
+    return save_atomic(image, path, variant['format'], **variant['options'])
+
+def save_image_variants(image, base_path, preset='web', executor=None):
+    """Encode image as <base_path><ext> for every variant in preset.
+
+    With an executor the encodes are only submitted and the futures are
+    returned, so the caller can keep working while they run. Without one,
+    the variants are encoded concurrently and the written paths returned.
+    The image must not be modified until its futures have completed.
+    """
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset {preset!r}, expected one of {', '.join(PRESETS)}")
+
+    if executor is None:
+        with ThreadPoolExecutor() as pool:
+            futures = save_image_variants(image, base_path, preset, pool)
+            return [future.result() for future in futures]
+
+    return [executor.submit(_save_variant, image, base_path + variant['ext'], variant)
+            for variant in PRESETS[preset]]
+
+def report_saved(futures):
+    """Wait for submitted encodes and print each file with its size"""
+    paths = [future.result() for future in futures]
+    for path in paths:
+        print(f"Saved {path} ({os.path.getsize(path) / 1024:,.0f} KB)")
+    return paths
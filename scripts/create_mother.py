@@ -3,8 +3,91 @@
 import sqlite3
 import glob
 import os
+import json
+import sys
+import argparse
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from elevation_changes import iter_new_points
+
+def create_mother_tables(mother_cur):
+    # Create table with same schema as grid databases
+    mother_cur.execute('''
+        CREATE TABLE IF NOT EXISTS elevation_points (
+            latitude REAL,
+            longitude REAL,
+            elevation REAL,
+            PRIMARY KEY (latitude, longitude)
+        )
+    ''')
+    
+    # High-water mark per grid database, committed with the points it covers
+    mother_cur.execute('''
+        CREATE TABLE IF NOT EXISTS sync_checkpoints (
+            db_file TEXT PRIMARY KEY,
+            max_id INTEGER NOT NULL,
+            collected_at TIMESTAMP,
+            row_count INTEGER NOT NULL,
+            last_row TEXT
+        )
+    ''')
+
+def load_checkpoint(mother_cur):
+    mother_cur.execute('SELECT db_file, max_id, collected_at, row_count, last_row FROM sync_checkpoints')
+    return {db_file: {'max_id': max_id, 'collected_at': collected_at,
+                      'count': row_count, 'last_row': json.loads(last_row) if last_row else None}
+            for db_file, max_id, collected_at, row_count, last_row in mother_cur.fetchall()}
+
+def apply_new_points(mother_conn, db_files):
+    """Copy rows collected since the last checkpoint from every grid database.
+
+    Returns False without finishing if a grid database had rows replaced or
+    deleted; mother.db cannot tell which of its rows came from that shard,
+    so the caller has to rebuild it.
+    """
+    mother_cur = mother_conn.cursor()
+    checkpoint = load_checkpoint(mother_cur)
+    
+    total_points = 0
+    for db_path, points, mark, reset in tqdm(iter_new_points(checkpoint, db_files), desc="Processing databases"):
+        if reset:
+            print(f"\n{db_path} had rows replaced or removed since the last run")
+            return False
+        if points:
+            # Insert points into mother database, newer rows replace older ones
+            mother_cur.executemany('''
+                INSERT OR REPLACE INTO elevation_points (latitude, longitude, elevation)
+                VALUES (?, ?, ?)
+            ''', points)
+            total_points += len(points)
+        
+        mother_cur.execute('''
+            INSERT OR REPLACE INTO sync_checkpoints (db_file, max_id, collected_at, row_count, last_row)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [db_path, mark['max_id'], mark['collected_at'], mark['count'],
+              json.dumps(mark['last_row']) if mark['last_row'] else None])
+        
+        # Commit after each database to save progress
+        mother_conn.commit()
+    
+    print(f"Copied {total_points:,} new points")
+    return True
+
+def print_mother_stats(mother_cur):
+    mother_cur.execute('SELECT COUNT(*) FROM elevation_points')
+    final_count = mother_cur.fetchone()[0]
+    
+    mother_cur.execute('SELECT MIN(elevation), MAX(elevation) FROM elevation_points')
+    min_elev, max_elev = mother_cur.fetchone()
+    
+    mother_cur.execute('SELECT MIN(latitude), MAX(latitude), MIN(longitude), MAX(longitude) FROM elevation_points')
+    min_lat, max_lat, min_lon, max_lon = mother_cur.fetchone()
+    
+    print(f"Total points: {final_count:,}")
+    print(f"Elevation range: {min_elev:.1f}m to {max_elev:.1f}m")
+    print(f"Coverage area: {min_lat:.4f}°N to {max_lat:.4f}°N, {min_lon:.4f}°W to {max_lon:.4f}°W")
+
 def create_mother_db():
     # Path to mother database
     mother_path = 'mother.db'
@@ -17,50 +100,12 @@ def create_mother_db():
     mother_conn = sqlite3.connect(mother_path)
     mother_cur = mother_conn.cursor()
     
-    # Create table with same schema as grid databases
-    mother_cur.execute('''
-        CREATE TABLE IF NOT EXISTS elevation_points (
-            latitude REAL,
-            longitude REAL,
-            elevation REAL,
-            PRIMARY KEY (latitude, longitude)
-        )
-    ''')
+    create_mother_tables(mother_cur)
     
-    # Get list of all grid databases
-    grid_dbs = glob.glob('grid_databases/mountains_*.db')
+    # Indexes are created after all data is inserted for better performance
+    grid_dbs = sorted(glob.glob('grid_databases/mountains_*.db'))
     print(f"Found {len(grid_dbs)} grid databases")
-    
-    # Create index after all data is inserted for better performance
-    total_points = 0
-    
-    # Process each database
-    for db_path in tqdm(grid_dbs, desc="Processing databases"):
-        try:
-            # Connect to grid database
-            grid_conn = sqlite3.connect(db_path)
-            grid_cur = grid_conn.cursor()
-            
-            # Get all points from this database
-            grid_cur.execute('SELECT latitude, longitude, elevation FROM elevation_points WHERE elevation IS NOT NULL')
-            points = grid_cur.fetchall()
-            
-            if points:
-                # Insert points into mother database, ignore duplicates
-                mother_cur.executemany('''
-                    INSERT OR REPLACE INTO elevation_points (latitude, longitude, elevation)
-                    VALUES (?, ?, ?)
-                ''', points)
-                
-                total_points += len(points)
-            
-            # Commit after each database to save progress
-            mother_conn.commit()
-            grid_conn.close()
-            
-        except sqlite3.Error as e:
-            print(f"Error processing {db_path}: {e}")
-            continue
+    apply_new_points(mother_conn, grid_dbs)
     
     print(f"\nCreating spatial index...")
     mother_cur.execute('''
@@ -75,24 +120,45 @@ def create_mother_db():
         ON elevation_points(elevation)
     ''')
     
-    # Get some stats
-    mother_cur.execute('SELECT COUNT(*) FROM elevation_points')
-    final_count = mother_cur.fetchone()[0]
-    
-    mother_cur.execute('SELECT MIN(elevation), MAX(elevation) FROM elevation_points')
-    min_elev, max_elev = mother_cur.fetchone()
-    
-    mother_cur.execute('SELECT MIN(latitude), MAX(latitude), MIN(longitude), MAX(longitude) FROM elevation_points')
-    min_lat, max_lat, min_lon, max_lon = mother_cur.fetchone()
-    
     print(f"\nMother database created successfully!")
-    print(f"Total points: {final_count:,}")
-    print(f"Elevation range: {min_elev:.1f}m to {max_elev:.1f}m")
-    print(f"Coverage area: {min_lat:.4f}°N to {max_lat:.4f}°N, {min_lon:.4f}°W to {max_lon:.4f}°W")
+    print_mother_stats(mother_cur)
     
     # Close connections
     mother_conn.commit()
     mother_conn.close()
 
+def update_mother_db():
+    """Add points collected since the last build to an existing mother.db"""
+    mother_path = 'mother.db'
+    if not os.path.exists(mother_path):
+        create_mother_db()
+        return
+    
+    mother_conn = sqlite3.connect(mother_path)
+    mother_cur = mother_conn.cursor()
+    create_mother_tables(mother_cur)
+    grid_dbs = sorted(glob.glob('grid_databases/mountains_*.db'))
+    removed = set(load_checkpoint(mother_cur)) - set(grid_dbs)
+    if removed:
+        print(f"{len(removed)} grid database(s) no longer exist")
+    if removed or not apply_new_points(mother_conn, grid_dbs):
+        # Rows from deleted shards or deleted rows can't be picked out of mother.db
+        mother_conn.close()
+        print("Rebuilding mother database from scratch...")
+        create_mother_db()
+        return
+    
+    print(f"\nMother database updated successfully!")
+    print_mother_stats(mother_cur)
+    mother_conn.close()
+
 if __name__ == '__main__':
-    create_mother_db() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Merge all grid databases into mother.db')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only copy points collected since the last run instead of rebuilding')
+    args = parser.parse_args()
+    
+    if args.incremental:
+        update_mother_db()
+    else:
+        create_mother_db()
@@ -0,0 +1,87 @@
+import importlib.util
+import os
+import sqlite3
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+spec = importlib.util.spec_from_file_location('create_mother', os.path.join(ROOT, 'scripts', 'create_mother.py'))
+create_mother = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(create_mother)
+
+with open(os.path.join(ROOT, 'SQL', '001_initial_schema.sql')) as f:
+    SCHEMA = f.read()
+
+
+def write_points(path, points, replace=False):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+    conn.executemany(f"""
+        {verb} INTO elevation_points (latitude, longitude, elevation, source)
+        VALUES (?, ?, ?, 'test')
+    """, points)
+    conn.commit()
+    conn.close()
+
+
+def grid_points(n, start=0):
+    return [(35.0 + i * 0.01, -106.0 - i * 0.01, 1500.0 + i) for i in range(start, start + n)]
+
+
+def mother_rows():
+    conn = sqlite3.connect('mother.db')
+    rows = sorted(conn.execute("SELECT latitude, longitude, elevation FROM elevation_points").fetchall())
+    conn.close()
+    return rows
+
+
+def full_rebuild_rows():
+    create_mother.create_mother_db()
+    return mother_rows()
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('grid_databases')
+    paths = ['grid_databases/mountains_0_0.db', 'grid_databases/mountains_0_1.db']
+    write_points(paths[0], grid_points(10))
+    write_points(paths[1], grid_points(10, start=50))
+    create_mother.create_mother_db()
+    return paths
+
+
+def test_incremental_adds_new_points(shards):
+    write_points(shards[0], grid_points(3, start=10))
+    create_mother.update_mother_db()
+
+    rows = mother_rows()
+    assert len(rows) == 23
+    assert rows == full_rebuild_rows()
+
+
+def test_incremental_matches_rebuild_after_delete(shards):
+    lat, lon, _ = grid_points(10)[4]
+    write_points(shards[0], [(lat, lon, 9999.0)], replace=True)
+    conn = sqlite3.connect(shards[1])
+    conn.execute("DELETE FROM elevation_points WHERE rowid IN (1, 2)")
+    conn.commit()
+    conn.close()
+    write_points(shards[1], grid_points(1, start=80))
+
+    create_mother.update_mother_db()
+
+    rows = mother_rows()
+    assert len(rows) == 19
+    assert (lat, lon, 9999.0) in rows
+    assert rows == full_rebuild_rows()
+
+
+def test_incremental_drops_rows_of_removed_shard(shards):
+    os.remove(shards[1])
+    create_mother.update_mother_db()
+
+    rows = mother_rows()
+    assert rows == sorted(grid_points(10))
+    assert rows == full_rebuild_rows()
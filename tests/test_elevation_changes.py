@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from elevation_changes import iter_new_points
+from generate_elevation_image import accumulate_points, update_grid_state
+
+with open(os.path.join(ROOT, 'SQL', '001_initial_schema.sql')) as f:
+    SCHEMA = f.read()
+
+
+def create_shard(path, points):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    insert_points(path, points, conn=conn)
+    conn.close()
+
+
+def insert_points(path, points, replace=False, conn=None):
+    own = conn is None
+    conn = conn or sqlite3.connect(path)
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+    conn.executemany(f"""
+        {verb} INTO elevation_points (latitude, longitude, elevation, source)
+        VALUES (?, ?, ?, 'test')
+    """, points)
+    conn.commit()
+    if own:
+        conn.close()
+
+
+def read_all(checkpoint, db_files):
+    """Run the feed once and return its output plus the advanced checkpoint"""
+    results = list(iter_new_points(checkpoint, db_files))
+    checkpoint = dict(checkpoint)
+    for db_file, points, mark, reset in results:
+        checkpoint[db_file] = mark
+    return results, checkpoint
+
+
+def grid_points(n, start=0):
+    return [(35.0 + i * 0.01, -106.0 - i * 0.01, 1500.0 + i) for i in range(start, start + n)]
+
+
+@pytest.fixture
+def shard(tmp_path):
+    path = str(tmp_path / 'mountains_0_0.db')
+    create_shard(path, grid_points(5))
+    return path
+
+
+def test_yields_only_rows_added_since_checkpoint(shard):
+    results, checkpoint = read_all({}, [shard])
+    assert [(len(points), reset) for _, points, _, reset in results] == [(5, False)]
+
+    insert_points(shard, grid_points(3, start=5))
+    results, checkpoint = read_all(checkpoint, [shard])
+    assert len(results) == 1
+    _, points, mark, reset = results[0]
+    assert not reset
+    assert points == grid_points(3, start=5)
+    assert mark['max_id'] == 8 and mark['count'] == 8
+
+    results, _ = read_all(checkpoint, [shard])
+    assert results == []
+
+
+def test_replaced_row_reports_reset_with_whole_shard(shard):
+    _, checkpoint = read_all({}, [shard])
+
+    lat, lon, _ = grid_points(5)[2]
+    insert_points(shard, [(lat, lon, 9999.0)], replace=True)
+    results, _ = read_all(checkpoint, [shard])
+
+    _, points, _, reset = results[0]
+    assert reset
+    assert len(points) == 5
+    assert (lat, lon, 9999.0) in points
+
+
+def test_deleted_row_reports_reset(shard):
+    _, checkpoint = read_all({}, [shard])
+
+    conn = sqlite3.connect(shard)
+    conn.execute("DELETE FROM elevation_points WHERE rowid = 1")
+    conn.commit()
+    conn.close()
+    insert_points(shard, grid_points(1, start=5))
+
+    results, _ = read_all(checkpoint, [shard])
+    assert results[0][3]
+
+
+def test_recreated_shard_past_old_mark_reports_reset(shard):
+    _, checkpoint = read_all({}, [shard])
+
+    os.remove(shard)
+    create_shard(shard, grid_points(8, start=100))
+
+    results, _ = read_all(checkpoint, [shard])
+    _, points, _, reset = results[0]
+    assert reset
+    assert points == grid_points(8, start=100)
+
+
+def test_shard_without_id_column_uses_rowid(tmp_path):
+    path = str(tmp_path / 'mountains_legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE elevation_points (latitude REAL, longitude REAL, elevation REAL)")
+    conn.executemany("INSERT INTO elevation_points VALUES (?, ?, ?)", grid_points(4))
+    conn.commit()
+    conn.close()
+
+    results, checkpoint = read_all({}, [path])
+    assert len(results[0][1]) == 4
+    assert checkpoint[path]['collected_at'] is None
+
+
+def test_grid_state_matches_full_rebuild_after_replacements(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('grid_databases')
+    shard = 'grid_databases/mountains_0_0.db'
+    create_shard(shard, grid_points(20))
+    state_path = str(tmp_path / 'state.npz')
+
+    update_grid_state(state_path, width=40, height=40)
+    insert_points(shard, [(lat, lon, 100.0) for lat, lon, _ in grid_points(20)[:5]], replace=True)
+    insert_points(shard, grid_points(5, start=20))
+    state = update_grid_state(state_path, width=40, height=40)
+
+    conn = sqlite3.connect(shard)
+    rows = conn.execute("SELECT latitude, longitude, elevation FROM elevation_points").fetchall()
+    conn.close()
+    sums = np.zeros((40, 40))
+    counts = np.zeros((40, 40), dtype=np.int32)
+    accumulate_points(rows, sums, counts)
+
+    assert state['total_points'] == len(rows) == 25
+    assert np.array_equal(state['counts'], counts)
+    assert np.allclose(state['sums'], sums)
+    assert state['min_elev'] == 100.0
+    assert state['max_elev'] == max(r[2] for r in rows)
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generate_terrain_mesh import TerrainMesher, split_into_chunks, write_mesh
+
+
+def sample_terrain(size, seed=0):
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size, 0:size]
+    return np.sin(xx / 5) * np.cos(yy / 7) * 50 + 1500 + rng.random((size, size)) * 10
+
+
+def rasterized_error(heights, vertices, triangles):
+    """Largest deviation between the mesh and the grid at every covered grid point"""
+    covered = np.zeros(heights.shape, dtype=bool)
+    worst = 0.0
+    for triangle in triangles:
+        (x0, y0), (x1, y1), (x2, y2) = vertices[triangle]
+        ys, xs = np.mgrid[min(y0, y1, y2):max(y0, y1, y2) + 1, min(x0, x1, x2):max(x0, x1, x2) + 1]
+        det = (y1 - y2) * (x0 - x2) + (x2 - x1) * (y0 - y2)
+        w0 = ((y1 - y2) * (xs - x2) + (x2 - x1) * (ys - y2)) / det
+        w1 = ((y2 - y0) * (xs - x2) + (x0 - x2) * (ys - y2)) / det
+        w2 = 1 - w0 - w1
+        inside = (w0 >= -1e-9) & (w1 >= -1e-9) & (w2 >= -1e-9)
+        plane = w0 * heights[y0, x0] + w1 * heights[y1, x1] + w2 * heights[y2, x2]
+        worst = max(worst, np.abs(plane - heights[ys, xs])[inside].max())
+        covered[ys[inside], xs[inside]] = True
+    return worst, covered.all()
+
+
+@pytest.mark.parametrize('size', [17, 65])
+@pytest.mark.parametrize('max_error', [1.0, 5.0, 20.0])
+def test_mesh_stays_within_max_error(size, max_error):
+    heights = sample_terrain(size)
+    vertices, triangles = TerrainMesher(size).build_mesh(heights, max_error)
+
+    worst, covered = rasterized_error(heights, vertices, triangles)
+    assert covered
+    assert worst <= max_error + 1e-9
+    assert len(vertices) < size * size
+
+
+def test_flat_terrain_is_two_triangles():
+    vertices, triangles = TerrainMesher(33).build_mesh(np.full((33, 33), 1800.0), 0.1)
+    assert len(triangles) == 2
+    assert len(vertices) == 4
+
+
+def test_rejects_grid_size_that_is_not_power_of_two_plus_one():
+    with pytest.raises(ValueError):
+        TerrainMesher(100)
+
+
+def test_chunks_fit_uint16_indices():
+    heights = sample_terrain(65)
+    vertices, triangles = TerrainMesher(65).build_mesh(heights, 0.0)
+    chunks = split_into_chunks(vertices, triangles, max_vertices=1000)
+
+    assert len(chunks) > 1
+    rebuilt = []
+    for chunk_vertices, indices in chunks:
+        assert len(chunk_vertices) <= 1000
+        assert indices.max() < len(chunk_vertices)
+        rebuilt.extend(map(tuple, chunk_vertices[indices].reshape(-1, 6)))
+    assert rebuilt == list(map(tuple, vertices[triangles].reshape(-1, 6)))
+
+
+def test_written_chunks_index_below_65535(tmp_path):
+    size = 257
+    heights = sample_terrain(size)
+    vertices, triangles = TerrainMesher(size).build_mesh(heights, 0.0)
+    chunks = split_into_chunks(vertices, triangles)
+    manifest = write_mesh(chunks, heights, str(tmp_path / 'mesh.json'))
+
+    assert len(manifest['chunks']) > 1
+    data = (tmp_path / 'mesh.bin').read_bytes()
+    assert json.loads((tmp_path / 'mesh.json').read_text()) == manifest
+    for chunk in manifest['chunks']:
+        assert chunk['vertexCount'] <= 65535
+        assert chunk['vertexByteOffset'] % 4 == 0 and chunk['indexByteOffset'] % 4 == 0
+        indices = np.frombuffer(data, dtype='<u2', count=chunk['indexCount'], offset=chunk['indexByteOffset'])
+        assert indices.max() < chunk['vertexCount'] < 65536
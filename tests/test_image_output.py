@@ -0,0 +1,80 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_output import PRESETS, save_image_variants
+
+
+def sample_image():
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:256, 0:256]
+    base = np.stack([xx, yy, (xx + yy) // 2], axis=-1).astype(np.float64)
+    noisy = base + rng.normal(0, 20, base.shape)
+    return Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+
+
+def serial_encode(image, variant):
+    image = image.copy()
+    if 'palette' in variant:
+        image = image.convert('RGB').quantize(colors=variant['palette'])
+    buffer = io.BytesIO()
+    image.save(buffer, format=variant['format'], **variant['options'])
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('preset', sorted(PRESETS))
+def test_concurrent_variants_match_serial_encode(tmp_path, preset):
+    image = sample_image()
+    base_path = str(tmp_path / 'elevation')
+
+    for _ in range(5):
+        paths = save_image_variants(image, base_path, preset)
+
+        assert paths == [base_path + variant['ext'] for variant in PRESETS[preset]]
+        for path, variant in zip(paths, PRESETS[preset]):
+            with open(path, 'rb') as f:
+                assert f.read() == serial_encode(image, variant), path
+
+    for path, variant in zip(paths, PRESETS[preset]):
+        with Image.open(path) as written:
+            assert written.format == variant['format']
+            if variant['format'] == 'JPEG':
+                assert written.info.get('progressive') == 1
+                reference = Image.open(io.BytesIO(serial_encode(image, variant)))
+                assert written.quantization == reference.quantization
+            if 'palette' in variant and variant['format'] == 'PNG':
+                assert written.mode == 'P'
+
+    # Temporary files are renamed into place, never left behind
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths)
+
+
+def test_unknown_preset_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        save_image_variants(sample_image(), str(tmp_path / 'x'), 'tiny')
+
+
+def test_graphic_webp_is_not_larger_than_png(tmp_path):
+    # A small antialiased contour plot stands in for the contour map
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    yy, xx = np.mgrid[0:100, 0:100]
+    field = np.sin(xx / 7.0) + np.cos(yy / 5.0) + (xx + yy) / 60.0
+    fig = plt.figure(figsize=(4, 4), dpi=100)
+    plt.contour(field, levels=20, colors='black', linewidths=0.5)
+    plt.contourf(field, levels=20, cmap='terrain')
+    fig.canvas.draw()
+    image = Image.frombuffer('RGBA', fig.canvas.get_width_height(), fig.canvas.buffer_rgba(),
+                             'raw', 'RGBA', 0, 1).convert('RGB')
+    plt.close(fig)
+
+    png_path, webp_path = save_image_variants(image, str(tmp_path / 'contour'), 'web-graphic')
+
+    assert os.path.getsize(webp_path) <= os.path.getsize(png_path)